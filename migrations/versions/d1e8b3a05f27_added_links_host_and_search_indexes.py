@@ -0,0 +1,52 @@
+"""Added links.host and search indexes
+
+Revision ID: d1e8b3a05f27
+Revises: a47e0d2b9c61
+Create Date: 2026-10-19 16:52:08.331470
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd1e8b3a05f27'
+down_revision: Union[str, None] = 'a47e0d2b9c61'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.add_column('links', sa.Column('host', sa.String(length=255), nullable=True))
+    # same normalization as links.search.normalize_host: userinfo up to the
+    # last "@", IPv6 brackets dropped, hosts over 255 characters left NULL
+    op.execute(
+        r"""
+        UPDATE links SET host = (
+            SELECT CASE WHEN length(parsed.host) <= 255 THEN parsed.host END
+            FROM (
+                SELECT regexp_replace(
+                    btrim(lower(substring(
+                        original_url
+                        from '^[A-Za-z][A-Za-z0-9+.-]*://(?:[^/?#]*@)?(\[[^]/?#]*\]|[^/:?#]+)'
+                    )), '[]'),
+                    '^www\.', ''
+                ) AS host
+            ) AS parsed
+        )
+        """
+    )
+    op.create_index('ix_links_user_id_host_id', 'links', ['user_id', 'host', 'id'], unique=False)
+    # the composite index above serves lookups by user_id alone
+    op.drop_index('ix_links_user_id', table_name='links')
+    op.create_index('ix_links_original_url_trgm', 'links', ['original_url'], unique=False, postgresql_using='gin', postgresql_ops={'original_url': 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    op.drop_index('ix_links_original_url_trgm', table_name='links', postgresql_using='gin', postgresql_ops={'original_url': 'gin_trgm_ops'})
+    op.create_index('ix_links_user_id', 'links', ['user_id'], unique=False)
+    op.drop_index('ix_links_user_id_host_id', table_name='links')
+    op.drop_column('links', 'host')
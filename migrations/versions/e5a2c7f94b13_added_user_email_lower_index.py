@@ -0,0 +1,26 @@
+"""Added user lower(email) index
+
+Revision ID: e5a2c7f94b13
+Revises: d1e8b3a05f27
+Create Date: 2026-10-19 19:21:44.806312
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a2c7f94b13'
+down_revision: Union[str, None] = 'd1e8b3a05f27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_user_email_lower', 'user', [sa.text('lower(email)')], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_user_email_lower', table_name='user')
@@ -1,8 +1,18 @@
+import json
+
 from fastapi import Depends
 from fastapi_users.db import SQLAlchemyBaseUserTableUUID, SQLAlchemyUserDatabase
+from redis import asyncio as aioredis
+from sqlalchemy import inspect
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import DeclarativeBase
-from database import engine, get_async_session
+from config import USER_CACHE_TTL
+from database import engine, get_async_session, get_redis
+
+USER_KEY_PREFIX = "auth:user"
+# The password hash never goes to Redis, cached users are only good for
+# authorization.
+CACHED_USER_FIELDS = ("email", "is_active", "is_superuser", "is_verified")
 
 
 class Base(DeclarativeBase):
@@ -18,5 +28,51 @@ async def create_db_and_tables():
         await conn.run_sync(Base.metadata.create_all)
 
 
-async def get_user_db(session: AsyncSession = Depends(get_async_session)):
-    yield SQLAlchemyUserDatabase(session, User)
+def user_key(user_id) -> str:
+    return f"{USER_KEY_PREFIX}:{user_id}"
+
+
+class CachedUserDatabase(SQLAlchemyUserDatabase):
+    """
+    Looks users up by id, which every authenticated request does, through a
+    short-lived Redis entry, so requests answered from a cache never check
+    out a database connection. Updates and deletes drop the entry; changes
+    made behind the API show up within USER_CACHE_TTL seconds.
+    """
+
+    def __init__(self, session: AsyncSession, user_table, redis: aioredis.Redis):
+        super().__init__(session, user_table)
+        self.redis = redis
+
+    async def get(self, id):
+        cached = await self.redis.get(user_key(id))
+        if cached is not None:
+            return self.user_table(id=id, **json.loads(cached))
+        user = await super().get(id)
+        if user is not None:
+            value = {field: getattr(user, field) for field in CACHED_USER_FIELDS}
+            await self.redis.set(user_key(id), json.dumps(value), ex=USER_CACHE_TTL)
+        return user
+
+    async def update(self, user, update_dict):
+        user = await super().update(await self._load(user), update_dict)
+        await self.redis.delete(user_key(user.id))
+        return user
+
+    async def delete(self, user) -> None:
+        await super().delete(await self._load(user))
+        await self.redis.delete(user_key(user.id))
+
+    async def _load(self, user):
+        # users built from the cache are not in the session, writing them
+        # back would insert a copy
+        if inspect(user).transient:
+            return await super().get(user.id)
+        return user
+
+
+async def get_user_db(
+    session: AsyncSession = Depends(get_async_session),
+    redis: aioredis.Redis = Depends(get_redis),
+):
+    yield CachedUserDatabase(session, User, redis)
@@ -0,0 +1,374 @@
+"""
+Stream links from a CSV or NDJSON file into the links table:
+
+    cd src && python -m commands.import_links legacy.csv --dry-run
+
+Every row has short_code and original_url, optionally expires_at (ISO 8601)
+and owner_email. Rows are loaded in chunks through COPY into a staging table
+and merged into links; progress is checkpointed after every chunk, so running
+the same command again resumes where it stopped.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import time
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Iterator, Optional
+from urllib.parse import urlsplit
+
+import asyncpg
+
+from config import DB_HOST, DB_NAME, DB_PASS, DB_PORT, DB_USER
+from database import redis
+from links.router import ALIAS_PATTERN, RESERVED_CODES
+from links.search import normalize_host, search_version_key
+from links.summary import summary_key, top_key
+
+STAGING_COLUMNS = [
+    "line",
+    "short_code",
+    "original_url",
+    "host",
+    "user_id",
+    "created_at",
+    "expires_at",
+]
+# Rows vanish on commit (or rollback in dry-run mode), one chunk at a time.
+CREATE_STAGING = """
+    CREATE TEMP TABLE links_import (
+        line bigint,
+        short_code varchar(100),
+        original_url varchar(2048),
+        host varchar(255),
+        user_id uuid,
+        created_at timestamp,
+        expires_at timestamp
+    ) ON COMMIT DELETE ROWS
+"""
+SELECT_CONFLICTS = """
+    SELECT s.line, s.short_code, s.original_url, l.original_url AS existing_url
+    FROM links_import s JOIN links l ON l.short_code = s.short_code
+"""
+MERGE = """
+    INSERT INTO links
+        (user_id, original_url, host, short_code, created_at, expires_at, click_count)
+    SELECT user_id, original_url, host, short_code, created_at, expires_at, 0
+    FROM links_import
+    ON CONFLICT (short_code) DO NOTHING
+"""
+OWNER_CACHE_SIZE = 100_000
+ROW_FIELDS = ["short_code", "original_url", "expires_at", "owner_email"]
+
+
+def read_rows(path: str, file_format: str) -> Iterator[Optional[dict]]:
+    """
+    Rows as dicts. NDJSON lines that are not valid JSON come out as None,
+    so they keep their line number and get rejected by validate_chunk.
+    """
+    with open(path, newline="", encoding="utf-8") as file:
+        if file_format == "csv":
+            yield from csv.DictReader(file)
+        else:
+            for line in file:
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    yield None
+
+
+def parse_expiry(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    expires_at = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    if expires_at.tzinfo is not None:
+        expires_at = expires_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return expires_at
+
+
+def validate_chunk(rows: list, first_line: int) -> tuple[list[dict], list]:
+    """
+    Split a chunk into rows ready for staging and rejected (line, code, reason)
+    tuples. Codes repeated inside the chunk are rejected after the first one.
+    """
+    valid = []
+    rejected = []
+    seen = set()
+    for line, row in enumerate(rows, start=first_line):
+        if not isinstance(row, dict):
+            rejected.append((line, "", "malformed line"))
+            continue
+        wrong_type = [
+            field
+            for field in ROW_FIELDS
+            if row.get(field) is not None and not isinstance(row[field], str)
+        ]
+        if wrong_type:
+            short_code = row.get("short_code")
+            short_code = short_code if isinstance(short_code, str) else ""
+            rejected.append((line, short_code, f"invalid {wrong_type[0]}"))
+            continue
+        short_code = (row.get("short_code") or "").strip()
+        original_url = (row.get("original_url") or "").strip()
+        if not ALIAS_PATTERN.match(short_code) or len(short_code) > 100:
+            rejected.append((line, short_code, "invalid short_code"))
+            continue
+        if short_code.lower() in RESERVED_CODES:
+            rejected.append((line, short_code, "reserved short_code"))
+            continue
+        if short_code in seen:
+            rejected.append((line, short_code, "duplicate short_code in input"))
+            continue
+        parts = urlsplit(original_url)
+        if parts.scheme not in ("http", "https") or not parts.netloc:
+            rejected.append((line, short_code, "invalid original_url"))
+            continue
+        if len(original_url) > 2048:
+            rejected.append((line, short_code, "original_url too long"))
+            continue
+        try:
+            expires_at = parse_expiry(row.get("expires_at"))
+        except ValueError:
+            rejected.append((line, short_code, "invalid expires_at"))
+            continue
+        seen.add(short_code)
+        valid.append(
+            {
+                "line": line,
+                "short_code": short_code,
+                "original_url": original_url,
+                "host": normalize_host(original_url),
+                "owner_email": (row.get("owner_email") or "").strip().lower() or None,
+                "expires_at": expires_at,
+            }
+        )
+    return valid, rejected
+
+
+async def resolve_owners(connection, emails: set, known: dict) -> None:
+    """
+    Look up user ids of emails not resolved yet, in a single query. Emails
+    without a user are remembered as None.
+    """
+    missing = [email for email in emails if email not in known]
+    if not missing:
+        return
+    if len(known) + len(missing) > OWNER_CACHE_SIZE:
+        known.clear()
+        missing = list(emails)
+    records = await connection.fetch(
+        'SELECT id, lower(email) AS email FROM "user" WHERE lower(email) = ANY($1)',
+        missing,
+    )
+    found = {record["email"]: record["id"] for record in records}
+    for email in missing:
+        known[email] = found.get(email)
+
+
+class _Rollback(Exception):
+    """Carries dry-run results out of the rolled back transaction."""
+
+    def __init__(self, inserted: int, conflicts: list):
+        self.inserted = inserted
+        self.conflicts = conflicts
+
+
+async def import_chunk(connection, rows: list[dict], dry_run: bool):
+    """
+    Stage and merge one chunk. Returns the number of inserted rows and the
+    conflicting rows whose code already points somewhere else.
+    """
+    now = datetime.utcnow()
+    async with connection.transaction():
+        await connection.copy_records_to_table(
+            "links_import",
+            columns=STAGING_COLUMNS,
+            records=[
+                (
+                    row["line"],
+                    row["short_code"],
+                    row["original_url"],
+                    row["host"],
+                    row["user_id"],
+                    now,
+                    row["expires_at"],
+                )
+                for row in rows
+            ],
+        )
+        existing = await connection.fetch(SELECT_CONFLICTS)
+        conflicts = [
+            record
+            for record in existing
+            if record["original_url"] != record["existing_url"]
+        ]
+        if dry_run:
+            inserted = len(rows) - len(existing)
+            # leave nothing behind, staged rows included
+            raise _Rollback(inserted, conflicts)
+        status = await connection.execute(MERGE)
+    return int(status.split()[-1]), conflicts
+
+
+def input_fingerprint(path: str) -> dict:
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def load_checkpoint(path: str, source: str) -> int:
+    """
+    Rows already imported from `source`. A checkpoint written for another
+    version of the file is refused, resuming from it would skip wrong rows.
+    """
+    if not os.path.exists(path):
+        return 0
+    with open(path) as file:
+        checkpoint = json.load(file)
+    if checkpoint.get("input") != input_fingerprint(source):
+        raise SystemExit(
+            f"{path} was written for a different version of {source}, "
+            "run with --restart to import it from the beginning"
+        )
+    return checkpoint["rows"]
+
+
+def save_checkpoint(path: str, source: str, rows: int) -> None:
+    with open(f"{path}.tmp", "w") as file:
+        json.dump({"rows": rows, "input": input_fingerprint(source)}, file)
+    os.replace(f"{path}.tmp", path)
+
+
+async def run_import(args: argparse.Namespace) -> None:
+    file_format = args.format or ("csv" if args.path.endswith(".csv") else "ndjson")
+    checkpoint = args.checkpoint or f"{args.path}.checkpoint"
+    report_path = args.report or f"{args.path}.report.csv"
+
+    done = 0
+    if not (args.restart or args.dry_run):
+        done = load_checkpoint(checkpoint, args.path)
+    rows = read_rows(args.path, file_format)
+    if done:
+        print(f"Resuming after {done} rows")
+        for _ in islice(rows, done):
+            pass
+
+    connection = await asyncpg.connect(
+        user=DB_USER, password=DB_PASS, host=DB_HOST, port=DB_PORT, database=DB_NAME
+    )
+    known_owners = {}
+    totals = {"imported": 0, "rejected": 0, "conflicts": 0, "existing": 0}
+    started = time.monotonic()
+    processed = 0
+    try:
+        await connection.execute(CREATE_STAGING)
+        with open(report_path, "a" if done else "w", newline="") as report_file:
+            report = csv.writer(report_file)
+            if not done:
+                report.writerow(["row", "short_code", "reason"])
+            while True:
+                chunk = list(islice(rows, args.chunk_size))
+                if not chunk:
+                    break
+                valid, rejected = validate_chunk(chunk, first_line=done + 1)
+
+                await resolve_owners(
+                    connection,
+                    {row["owner_email"] for row in valid if row["owner_email"]},
+                    known_owners,
+                )
+                staged = []
+                for row in valid:
+                    row["user_id"] = None
+                    if row["owner_email"]:
+                        row["user_id"] = known_owners[row["owner_email"]]
+                        if row["user_id"] is None and args.unknown_owner == "reject":
+                            rejected.append(
+                                (row["line"], row["short_code"], "unknown owner_email")
+                            )
+                            continue
+                    staged.append(row)
+
+                conflicts = []
+                inserted = 0
+                if staged:
+                    try:
+                        inserted, conflicts = await import_chunk(
+                            connection, staged, args.dry_run
+                        )
+                    except _Rollback as rollback:
+                        inserted, conflicts = rollback.inserted, rollback.conflicts
+
+                for line, short_code, reason in rejected:
+                    report.writerow([line, short_code, reason])
+                for record in conflicts:
+                    report.writerow(
+                        [
+                            record["line"],
+                            record["short_code"],
+                            f"conflict: already points to {record['existing_url']}",
+                        ]
+                    )
+                report_file.flush()
+
+                done += len(chunk)
+                processed += len(chunk)
+                totals["imported"] += inserted
+                totals["rejected"] += len(rejected)
+                totals["conflicts"] += len(conflicts)
+                totals["existing"] += len(staged) - inserted - len(conflicts)
+                if not args.dry_run:
+                    save_checkpoint(checkpoint, args.path, done)
+                    owners = {row["user_id"] for row in staged if row["user_id"]}
+                    async with redis.pipeline(transaction=False) as pipe:
+                        for owner in owners:
+                            pipe.incr(search_version_key(owner))
+                            pipe.delete(summary_key(owner), top_key(owner))
+                        await pipe.execute()
+
+                rate = processed / (time.monotonic() - started)
+                print(
+                    f"{done} rows: {totals['imported']} imported, "
+                    f"{totals['existing']} already present, "
+                    f"{totals['conflicts']} conflicts, {totals['rejected']} rejected "
+                    f"({rate:.0f} rows/s)"
+                )
+    finally:
+        await connection.close()
+
+    if args.dry_run:
+        print("Dry run, nothing was written to the database")
+    print(f"Rejected rows and conflicts are listed in {report_path}")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("path", help="CSV file with a header row, or NDJSON file")
+    parser.add_argument(
+        "--format", choices=["csv", "ndjson"], help="Detected from the extension"
+    )
+    parser.add_argument("--chunk-size", type=int, default=20_000)
+    parser.add_argument(
+        "--unknown-owner",
+        choices=["reject", "anonymous"],
+        default="reject",
+        help="What to do with rows whose owner_email has no user",
+    )
+    parser.add_argument("--checkpoint", help="Defaults to <path>.checkpoint")
+    parser.add_argument("--report", help="Defaults to <path>.report.csv")
+    parser.add_argument(
+        "--restart", action="store_true", help="Ignore an existing checkpoint"
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Validate and detect conflicts without writing anything",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(run_import(parse_args()))
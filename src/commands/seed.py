@@ -0,0 +1,229 @@
+"""
+Bulk-load synthetic users and links through COPY, e.g. to check query plans
+at production scale:
+
+    cd src && python -m commands.seed --users 100000 --links 10000000
+"""
+import argparse
+import asyncio
+import random
+import string
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+import asyncpg
+from fastapi_users.password import PasswordHelper
+
+from config import DB_HOST, DB_NAME, DB_PASS, DB_PORT, DB_USER
+from links.search import normalize_host
+
+SEED_NAMESPACE = uuid.UUID("6f1d6a4e-8a9b-4c55-9d7e-3f0f5b1c2a10")
+ALPHABET = string.digits + string.ascii_letters
+# Aliases are limited to [A-Za-z0-9_-], so prefixed codes can never take one.
+SEED_CODE_PREFIX = "~"
+# Only the first user of a run, the one owning the most links, can log in,
+# so query plans can be checked for a heavy owner.
+SEED_PASSWORD = "seeded-password"
+SEED_PLACEHOLDER_PASSWORD = "seeded-user-without-password"
+
+POPULAR_HOSTS = [
+    "www.youtube.com",
+    "github.com",
+    "docs.google.com",
+    "www.amazon.com",
+    "medium.com",
+    "www.linkedin.com",
+    "t.me",
+    "habr.com",
+    "stackoverflow.com",
+    "en.wikipedia.org",
+    "www.reddit.com",
+    "vk.com",
+    "drive.google.com",
+    "www.notion.so",
+    "example.com",
+]
+# Zipf-like: the first host is the most popular one
+POPULAR_WEIGHTS = [1 / rank for rank in range(1, len(POPULAR_HOSTS) + 1)]
+TLDS = ["com", "org", "net", "io", "ru", "dev", "co.uk", "de"]
+WORDS = [
+    "blog", "campaign", "docs", "watch", "product", "news", "2024", "2025",
+    "2026", "promo", "article", "user", "item", "event", "video", "release",
+    "guide", "api", "spring", "summer", "sale", "report", "post", "page",
+]
+
+
+def seed_user_id(run: str, index: int) -> uuid.UUID:
+    """
+    Deterministic user ids, so links can pick an owner without keeping
+    every generated user in memory.
+    """
+    return uuid.uuid5(SEED_NAMESPACE, f"{run}-{index}")
+
+
+def encode_code(number: int, length: int = 7) -> str:
+    """
+    Zero-padded base62 code behind SEED_CODE_PREFIX, a character neither
+    generated codes nor custom aliases contain, so seeded rows never
+    collide with real ones.
+    """
+    chars = []
+    while number:
+        number, rest = divmod(number, len(ALPHABET))
+        chars.append(ALPHABET[rest])
+    return SEED_CODE_PREFIX + "".join(reversed(chars)).rjust(length, "0")
+
+
+def random_url(rng: random.Random) -> str:
+    if rng.random() < 0.7:
+        host = rng.choices(POPULAR_HOSTS, POPULAR_WEIGHTS)[0]
+    else:
+        host = f"{rng.choice(WORDS)}{rng.randint(1, 50000)}.{rng.choice(TLDS)}"
+    segments = [
+        rng.choice(WORDS) if rng.random() < 0.6 else str(rng.randint(1, 10**6))
+        for _ in range(rng.randint(0, 4))
+    ]
+    url = f"https://{host}/{'/'.join(segments)}"
+    if rng.random() < 0.3:
+        url += f"?utm_source={rng.choice(WORDS)}&utm_campaign={rng.choice(WORDS)}"
+    return url
+
+
+def random_expiry(rng: random.Random, now: datetime) -> Optional[datetime]:
+    roll = rng.random()
+    if roll < 0.7:
+        return None
+    if roll < 0.9:
+        return now + timedelta(days=rng.randint(1, 365))
+    return now - timedelta(days=rng.randint(1, 365))
+
+
+def seed_email(run: str, index: int) -> str:
+    return f"seed-{run}-{index}@example.com"
+
+
+def user_records(run: str, count: int, rng: random.Random, now: datetime):
+    heavy_owner_password = PasswordHelper().hash(SEED_PASSWORD)
+    for index in range(count):
+        yield (
+            seed_user_id(run, index),
+            seed_email(run, index),
+            heavy_owner_password if index == 0 else SEED_PLACEHOLDER_PASSWORD,
+            now - timedelta(seconds=rng.randint(0, 2 * 365 * 24 * 3600)),
+            True,
+            False,
+            True,
+        )
+
+
+def link_records(
+    run: str,
+    users: int,
+    start: int,
+    count: int,
+    anonymous_share: float,
+    rng: random.Random,
+    now: datetime,
+):
+    for number in range(start, start + count):
+        owner = None
+        if users and rng.random() >= anonymous_share:
+            # skewed towards low indices: some users own far more links than others
+            owner = seed_user_id(run, int(users * rng.random() ** 3))
+        url = random_url(rng)
+        yield (
+            owner,
+            url,
+            normalize_host(url),
+            encode_code(number),
+            now - timedelta(seconds=rng.randint(0, 2 * 365 * 24 * 3600)),
+            random_expiry(rng, now),
+            int(rng.paretovariate(1.5)) - 1,
+        )
+
+
+async def copy_in_batches(connection, table, columns, records, total, batch_size):
+    started = time.monotonic()
+    done = 0
+    while done < total:
+        size = min(batch_size, total - done)
+        batch = [next(records) for _ in range(size)]
+        await connection.copy_records_to_table(table, records=batch, columns=columns)
+        done += size
+        rate = done / (time.monotonic() - started)
+        print(f"{table}: {done}/{total} rows ({rate:.0f} rows/s)")
+
+
+async def seed(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    run = args.run or uuid.uuid4().hex[:8]
+    now = datetime.utcnow()
+
+    connection = await asyncpg.connect(
+        user=DB_USER, password=DB_PASS, host=DB_HOST, port=DB_PORT, database=DB_NAME
+    )
+    try:
+        await copy_in_batches(
+            connection,
+            "user",
+            [
+                "id",
+                "email",
+                "hashed_password",
+                "registered_at",
+                "is_active",
+                "is_superuser",
+                "is_verified",
+            ],
+            user_records(run, args.users, rng, now),
+            args.users,
+            args.batch_size,
+        )
+        start = await connection.fetchval("SELECT coalesce(max(id), 0) + 1 FROM links")
+        await copy_in_batches(
+            connection,
+            "links",
+            [
+                "user_id",
+                "original_url",
+                "host",
+                "short_code",
+                "created_at",
+                "expires_at",
+                "click_count",
+            ],
+            link_records(
+                run, args.users, start, args.links, args.anonymous_share, rng, now
+            ),
+            args.links,
+            args.batch_size,
+        )
+        await connection.execute('ANALYZE "user"')
+        await connection.execute("ANALYZE links")
+    finally:
+        await connection.close()
+    print(f"Seeded run {run}")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--links", type=int, default=1_000_000)
+    parser.add_argument("--batch-size", type=int, default=50_000)
+    parser.add_argument(
+        "--anonymous-share",
+        type=float,
+        default=0.3,
+        help="Share of links created without an owner",
+    )
+    parser.add_argument("--seed", type=int, default=None, help="Random seed")
+    parser.add_argument(
+        "--run", default=None, help="Tag used in seeded emails (random by default)"
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(seed(parse_args()))
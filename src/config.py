@@ -13,3 +13,12 @@ DB_NAME = os.getenv("DB_NAME")
 SECRET = os.getenv("SECRET")
 
 REDIS_HOST = os.getenv("REDIS_HOST")
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", 30))
+
+VISITOR_SALT = os.getenv("VISITOR_SALT", SECRET)
+VISITORS_PERSIST_INTERVAL = int(os.getenv("VISITORS_PERSIST_INTERVAL", 3600))
+
+LINK_CACHE_TTL = int(os.getenv("LINK_CACHE_TTL", 60))
+LINK_CACHE_MAX_BYTES = int(os.getenv("LINK_CACHE_MAX_BYTES", 16 * 1024 * 1024))
+
+SUMMARY_RECONCILE_INTERVAL = int(os.getenv("SUMMARY_RECONCILE_INTERVAL", 3600))
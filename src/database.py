@@ -1,13 +1,60 @@
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Optional
+from redis import asyncio as aioredis
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
-from config import DB_HOST, DB_NAME, DB_PASS, DB_PORT, DB_USER
+from config import DB_HOST, DB_NAME, DB_PASS, DB_PORT, DB_USER, REDIS_HOST
 
 DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
 engine = create_async_engine(DATABASE_URL)
 async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
 
+redis = aioredis.from_url(f"redis://{REDIS_HOST}")
 
-async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
-    async with async_session_maker() as session:
+
+class LazySession:
+    """
+    Stands in for an AsyncSession and only creates it on first use, so
+    requests answered from a cache never check out a pooled connection.
+    """
+
+    def __init__(self, session_maker: async_sessionmaker):
+        self._session_maker = session_maker
+        self._session: Optional[AsyncSession] = None
+
+    @property
+    def started(self) -> bool:
+        return self._session is not None
+
+    def __getattr__(self, name):
+        if self._session is None:
+            self._session = self._session_maker()
+        return getattr(self._session, name)
+
+    async def commit(self) -> None:
+        if self._session is not None:
+            await self._session.commit()
+
+    async def rollback(self) -> None:
+        if self._session is not None:
+            await self._session.rollback()
+
+    async def release(self) -> None:
+        """
+        Close the underlying session now instead of at the end of the request.
+        Using the session again afterwards opens a new one.
+        """
+        if self._session is not None:
+            session, self._session = self._session, None
+            await session.close()
+
+
+async def get_async_session() -> AsyncGenerator[LazySession, None]:
+    session = LazySession(async_session_maker)
+    try:
         yield session
+    finally:
+        await session.release()
+
+
+async def get_redis() -> aioredis.Redis:
+    return redis
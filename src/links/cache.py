@@ -0,0 +1,327 @@
+import asyncio
+import json
+import logging
+import sys
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import LINK_CACHE_MAX_BYTES, LINK_CACHE_TTL
+from database import redis as default_redis
+from links.models import links as Link
+
+logger = logging.getLogger(__name__)
+
+RESOLVE_KEY_PREFIX = "links:resolve"
+GENERATION_KEY_PREFIX = "links:resolve-gen"
+INVALIDATION_CHANNEL = "links:invalidate"
+# Generations only have to outlive a cache fill in flight, but must not be
+# reset while one is running.
+GENERATION_TTL = 24 * 3600
+
+# Rough per-entry bookkeeping cost (entry object, OrderedDict node, key
+# reference), added on top of the string payloads.
+_ENTRY_OVERHEAD = 200
+
+# A fill is dropped when the link was invalidated after its value was read,
+# otherwise a slow reader could put back a URL that was just changed.
+FILL = """
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+_fill = default_redis.register_script(FILL)
+
+
+class _Entry:
+    __slots__ = ("original_url", "expires_at", "deadline", "size")
+
+    def __init__(
+        self,
+        original_url: str,
+        expires_at: Optional[datetime],
+        deadline: float,
+        size: int,
+    ):
+        self.original_url = original_url
+        self.expires_at = expires_at
+        self.deadline = deadline
+        self.size = size
+
+
+class LinkCache:
+    """
+    Bounded in-process LRU of resolved links, capped by an estimate of its
+    size in bytes. Entries also expire after their own TTL.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        # Only trusted while the invalidation listener is subscribed.
+        self.enabled = False
+        # Bumped on every invalidation, fills started before one are dropped.
+        self.generation = 0
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, short_code: str) -> Optional[dict]:
+        if not self.enabled:
+            return None
+        entry = self._entries.get(short_code)
+        if entry is None:
+            return None
+        if entry.deadline <= time.monotonic():
+            self._discard(short_code)
+            return None
+        self._entries.move_to_end(short_code)
+        return {"original_url": entry.original_url, "expires_at": entry.expires_at}
+
+    def set(
+        self,
+        short_code: str,
+        original_url: str,
+        expires_at: Optional[datetime],
+        ttl: float,
+        generation: Optional[int] = None,
+    ) -> None:
+        """
+        Cache a link unless `generation` was taken before the latest
+        invalidation.
+        """
+        if not self.enabled or ttl <= 0:
+            return
+        if generation is not None and generation != self.generation:
+            return
+        size = sys.getsizeof(short_code) + sys.getsizeof(original_url) + _ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        self._discard(short_code)
+        self._entries[short_code] = _Entry(
+            original_url, expires_at, time.monotonic() + ttl, size
+        )
+        self.size += size
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= evicted.size
+
+    def invalidate(self, short_code: str) -> None:
+        self.generation += 1
+        self._discard(short_code)
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._entries.clear()
+        self.size = 0
+
+    def _discard(self, short_code: str) -> None:
+        entry = self._entries.pop(short_code, None)
+        if entry is not None:
+            self.size -= entry.size
+
+
+link_cache = LinkCache(LINK_CACHE_MAX_BYTES)
+
+
+def resolve_key(short_code: str) -> str:
+    return f"{RESOLVE_KEY_PREFIX}:{short_code}"
+
+
+def generation_key(short_code: str) -> str:
+    return f"{GENERATION_KEY_PREFIX}:{short_code}"
+
+
+def cache_ttl(expires_at: Optional[datetime]) -> int:
+    """
+    Seconds a resolved link may be cached: never past the link expiry.
+    """
+    if expires_at is None:
+        return LINK_CACHE_TTL
+    remaining = (expires_at - datetime.utcnow()).total_seconds()
+    return max(0, min(LINK_CACHE_TTL, int(remaining)))
+
+
+def _encode(original_url: str, expires_at: Optional[datetime]) -> str:
+    return json.dumps(
+        {
+            "original_url": original_url,
+            "expires_at": expires_at and expires_at.isoformat(),
+        }
+    )
+
+
+def _decode(value: bytes) -> dict:
+    data = json.loads(value)
+    expires_at = data["expires_at"] and datetime.fromisoformat(data["expires_at"])
+    return {"original_url": data["original_url"], "expires_at": expires_at}
+
+
+async def resolve_link(
+    redis: aioredis.Redis, session: AsyncSession, short_code: str
+) -> Optional[dict]:
+    """
+    Resolve a short code to its original URL and expiry through the
+    in-process cache, then Redis, then the database. Cache generations are
+    taken before reading, so a concurrent invalidation is never undone.
+    """
+    link = link_cache.get(short_code)
+    if link is not None:
+        return link
+
+    local_generation = link_cache.generation
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.get(resolve_key(short_code))
+        pipe.get(generation_key(short_code))
+        cached, generation = await pipe.execute()
+    if cached is not None:
+        link = _decode(cached)
+        link_cache.set(
+            short_code,
+            **link,
+            ttl=cache_ttl(link["expires_at"]),
+            generation=local_generation,
+        )
+        return link
+
+    statement = select(Link.c.original_url, Link.c.expires_at).where(
+        Link.c.short_code == short_code
+    )
+    result = await session.execute(statement)
+    row = result.first()
+    if row is None:
+        return None
+
+    ttl = cache_ttl(row.expires_at)
+    if ttl > 0:
+        value = _encode(row.original_url, row.expires_at)
+        await _fill(
+            keys=[resolve_key(short_code), generation_key(short_code)],
+            args=[int(generation or 0), value, ttl],
+            client=redis,
+        )
+        link_cache.set(
+            short_code, row.original_url, row.expires_at, ttl, local_generation
+        )
+    return {"original_url": row.original_url, "expires_at": row.expires_at}
+
+
+async def resolve_links(
+    redis: aioredis.Redis, session: AsyncSession, short_codes: list[str]
+) -> dict[str, dict]:
+    """
+    Bulk resolve_link: a single MGET for codes missing from the in-process
+    cache and a single query for the rest. Unknown and expired codes are
+    left out of the result.
+    """
+    resolved = {}
+    pending = []
+    for short_code in short_codes:
+        link = link_cache.get(short_code)
+        if link is not None:
+            resolved[short_code] = link
+        else:
+            pending.append(short_code)
+
+    local_generation = link_cache.generation
+    misses = {}
+    if pending:
+        keys = [resolve_key(code) for code in pending]
+        keys += [generation_key(code) for code in pending]
+        values = await redis.mget(keys)
+        cached, generations = values[: len(pending)], values[len(pending) :]
+        for short_code, value, generation in zip(pending, cached, generations):
+            if value is None:
+                misses[short_code] = int(generation or 0)
+                continue
+            link = _decode(value)
+            link_cache.set(
+                short_code,
+                **link,
+                ttl=cache_ttl(link["expires_at"]),
+                generation=local_generation,
+            )
+            resolved[short_code] = link
+
+    if misses:
+        statement = select(
+            Link.c.short_code, Link.c.original_url, Link.c.expires_at
+        ).where(Link.c.short_code.in_(list(misses)))
+        result = await session.execute(statement)
+        async with redis.pipeline(transaction=False) as pipe:
+            for row in result.all():
+                resolved[row.short_code] = {
+                    "original_url": row.original_url,
+                    "expires_at": row.expires_at,
+                }
+                ttl = cache_ttl(row.expires_at)
+                if ttl > 0:
+                    value = _encode(row.original_url, row.expires_at)
+                    await _fill(
+                        keys=[
+                            resolve_key(row.short_code),
+                            generation_key(row.short_code),
+                        ],
+                        args=[misses[row.short_code], value, ttl],
+                        client=pipe,
+                    )
+                    link_cache.set(
+                        row.short_code,
+                        row.original_url,
+                        row.expires_at,
+                        ttl,
+                        local_generation,
+                    )
+            await pipe.execute()
+
+    return {
+        short_code: link
+        for short_code, link in resolved.items()
+        if cache_ttl(link["expires_at"]) > 0
+    }
+
+
+async def invalidate_link(redis: aioredis.Redis, short_code: str) -> None:
+    """
+    Drop a link from every cache layer and tell the other workers to do the same.
+    """
+    link_cache.invalidate(short_code)
+    async with redis.pipeline(transaction=False) as pipe:
+        # bump first: a fill landing before the delete is then removed by it
+        pipe.incr(generation_key(short_code))
+        pipe.expire(generation_key(short_code), GENERATION_TTL)
+        pipe.delete(resolve_key(short_code))
+        pipe.publish(INVALIDATION_CHANNEL, short_code)
+        await pipe.execute()
+
+
+async def run_invalidation_listener(redis: aioredis.Redis = default_redis) -> None:
+    """
+    Keep the in-process cache coherent with the other workers. The cache is
+    flushed on every (re)subscription and disabled while disconnected, since
+    messages published in between are lost.
+    """
+    while True:
+        try:
+            async with redis.pubsub() as pubsub:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                link_cache.clear()
+                link_cache.enabled = True
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        link_cache.invalidate(message["data"].decode())
+        except (RedisError, OSError):
+            logger.warning("Link invalidation channel lost, reconnecting")
+        finally:
+            link_cache.enabled = False
+            link_cache.clear()
+        await asyncio.sleep(1)
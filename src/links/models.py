@@ -1,4 +1,14 @@
-from sqlalchemy import Table, Column, Integer, DateTime, MetaData, String
+from sqlalchemy import (
+    Table,
+    Column,
+    Integer,
+    Date,
+    DateTime,
+    Index,
+    LargeBinary,
+    MetaData,
+    String,
+)
 from sqlalchemy.dialects.postgresql import UUID
 
 metadata = MetaData()
@@ -7,10 +17,32 @@ links = Table(
     "links",
     metadata,
     Column("id", Integer, primary_key=True),
+    # lookups by user_id alone are served by ix_links_user_id_host_id
     Column("user_id", UUID, nullable=True),
     Column("original_url", String(length=2048), nullable=False),
+    # normalized host of original_url, NULL if too long, see
+    # links.search.normalize_host
+    Column("host", String(length=255), nullable=True),
     Column("short_code", String(length=100), nullable=False, unique=True, index=True),
     Column("created_at", DateTime, nullable=False),
     Column("expires_at", DateTime, nullable=True),
     Column("click_count", Integer, nullable=False, default=0),
+    Index("ix_links_user_id_host_id", "user_id", "host", "id"),
+    # prefix and substring search, needs the pg_trgm extension
+    Index(
+        "ix_links_original_url_trgm",
+        "original_url",
+        postgresql_using="gin",
+        postgresql_ops={"original_url": "gin_trgm_ops"},
+    ),
+)
+
+# Daily unique visitors persisted from Redis. `hll` keeps the raw HyperLogLog
+# so ranges can still be merged after the Redis key expired.
+link_visitors = Table(
+    "link_visitors",
+    metadata,
+    Column("short_code", String(length=100), primary_key=True),
+    Column("day", Date, primary_key=True),
+    Column("hll", LargeBinary, nullable=False),
 )
@@ -1,25 +1,59 @@
+import json
 import re
-from datetime import datetime
+from datetime import date, datetime, timedelta
+from typing import Optional
 import string
 import secrets
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from fastapi.responses import RedirectResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import RedirectResponse, StreamingResponse
 
-from sqlalchemy.ext.asyncio import AsyncSession
+from redis import asyncio as aioredis
 from sqlalchemy import select, insert, update, delete
 
-from database import get_async_session
+from database import LazySession, get_async_session, get_redis
 from auth.users import current_user, current_active_user
 from auth.db import User
+from links.cache import cache_ttl, invalidate_link, resolve_link, resolve_links
 from links.models import links as Link
-from links.schemas import LinkCreate, LinkRead, LinkUpdate
-from fastapi_cache.decorator import cache
+from links.schemas import (
+    LinkCreate,
+    LinkRead,
+    LinkResolved,
+    LinkResolveRequest,
+    LinkResolveResult,
+    LinkStats,
+    LinkSummary,
+    LinkUpdate,
+)
+from links.search import (
+    SEARCH_CACHE_TTL,
+    build_search_statement,
+    invalidate_user_searches,
+    normalize_host,
+    search_cache_key,
+)
+from links.summary import (
+    LEADERBOARD_SIZE,
+    TOP_LIMIT,
+    get_summary,
+    record_click,
+    record_link_created,
+    record_link_deleted,
+)
+from links.visitors import (
+    MAX_RANGE_DAYS,
+    count_unique_visitors,
+    forget_visitors,
+    record_visit,
+    visitor_fingerprint,
+)
 
 
 router = APIRouter(prefix="/links", tags=["links"])
 
-RESERVED_CODES = {"shorten", "search"}
+RESERVED_CODES = {"shorten", "search", "resolve", "summary"}
+ALIAS_PATTERN = re.compile("^[A-Za-z0-9_-]+$")
 
 
 def generate_random_code(length: int = 6) -> str:
@@ -30,7 +64,8 @@ def generate_random_code(length: int = 6) -> str:
 @router.post("/shorten", response_model=LinkRead, status_code=status.HTTP_201_CREATED)
 async def create_short_link(
     data: LinkCreate,
-    session: AsyncSession = Depends(get_async_session),
+    session: LazySession = Depends(get_async_session),
+    redis: aioredis.Redis = Depends(get_redis),
     user: User = Depends(current_user),
 ):
     """
@@ -40,7 +75,7 @@ async def create_short_link(
     alias = data.alias
     if alias:
         alias = alias.strip()
-        if not re.match("^[A-Za-z0-9_-]+$", alias):
+        if not ALIAS_PATTERN.match(alias):
             raise HTTPException(
                 status_code=400,
                 detail="Alias may only contain letters, digits, '_' or '-'.",
@@ -77,6 +112,7 @@ async def create_short_link(
     new_link = {
         "user_id": owner_id,
         "original_url": str(data.original_url),
+        "host": normalize_host(str(data.original_url)),
         "short_code": short_code,
         "created_at": datetime.now(),
         "expires_at": data.expires_at.replace(tzinfo=None)
@@ -87,72 +123,199 @@ async def create_short_link(
     statement = insert(Link).values(**new_link)
     await session.execute(statement)
     await session.commit()
+    await invalidate_user_searches(redis, owner_id)
+    if owner_id is not None:
+        await record_link_created(redis, owner_id, short_code)
     return new_link
 
 
 @router.get("/search", response_model=list[LinkRead])
-@cache(expire=60)
 async def search_links(
-    original_url: str = Query(..., description="Original URL to search for"),
-    session: AsyncSession = Depends(get_async_session),
+    response: Response,
+    original_url: Optional[str] = Query(None, description="Original URL to search for"),
+    host: Optional[str] = Query(None, description="Host of the original URL"),
+    prefix: Optional[str] = Query(None, description="Prefix of the original URL"),
+    contains: Optional[str] = Query(None, description="Substring of the original URL"),
+    after: Optional[int] = Query(None, description="Cursor from X-Next-Cursor"),
+    limit: int = Query(50, ge=1, le=500),
+    session: LazySession = Depends(get_async_session),
+    redis: aioredis.Redis = Depends(get_redis),
     user=Depends(current_active_user),
 ):
     """
-    Search for shortened links by original URL. Returns links owned by the current user that match the URL.
+    Search for shortened links owned by the current user by exact original URL,
+    host (e.g. example.com, www. is ignored), URL prefix or substring.
+    Filters are combined. When more results exist, the X-Next-Cursor response
+    header holds the value to pass as `after` for the next page.
     """
-    statement = select(Link).filter(
-        Link.c.user_id == user.id, Link.c.original_url == original_url
+    if original_url is None and host is None and prefix is None and contains is None:
+        raise HTTPException(
+            status_code=400,
+            detail="Provide original_url, host, prefix or contains to search.",
+        )
+    if host is not None:
+        host = normalize_host(host)
+        if host is None:
+            raise HTTPException(status_code=400, detail="Invalid host.")
+    if contains is not None and len(contains) < 3:
+        raise HTTPException(
+            status_code=400, detail="Substring must be at least 3 characters long."
+        )
+
+    query = {
+        "original_url": original_url,
+        "host": host,
+        "prefix": prefix,
+        "contains": contains,
+        "after": after,
+        "limit": limit,
+    }
+    key = await search_cache_key(redis, user.id, query)
+    cached = await redis.get(key)
+    if cached is not None:
+        page = json.loads(cached)
+    else:
+        statement = build_search_statement(user.id, **query)
+        result = await session.execute(statement)
+        rows = result.mappings().all()
+        await session.release()
+        page = {
+            "links": [
+                LinkRead.model_validate(dict(row)).model_dump(mode="json")
+                for row in rows[:limit]
+            ],
+            "next_cursor": rows[limit - 1]["id"] if len(rows) > limit else None,
+        }
+        await redis.set(key, json.dumps(page), ex=SEARCH_CACHE_TTL)
+
+    if page["next_cursor"] is not None:
+        response.headers["X-Next-Cursor"] = str(page["next_cursor"])
+    return page["links"]
+
+
+@router.get("/summary", response_model=LinkSummary)
+async def get_links_summary(
+    limit: int = Query(TOP_LIMIT, ge=1, le=LEADERBOARD_SIZE),
+    session: LazySession = Depends(get_async_session),
+    redis: aioredis.Redis = Depends(get_redis),
+    user=Depends(current_active_user),
+):
+    """
+    Total links and clicks of the current user and their most clicked links.
+    Maintained incrementally in Redis, so the cost does not grow with the
+    number of links.
+    """
+    return await get_summary(redis, session, user.id, limit)
+
+
+@router.post("/resolve", response_model=LinkResolveResult)
+async def resolve_short_links(
+    data: LinkResolveRequest,
+    response_format: str = Query(
+        "json", alias="format", pattern="^(json|ndjson)$", description="json or ndjson"
+    ),
+    session: LazySession = Depends(get_async_session),
+    redis: aioredis.Redis = Depends(get_redis),
+    user=Depends(current_active_user),
+):
+    """
+    Resolve many short codes at once, e.g. for edge caches prefetching popular
+    links. Does not count clicks. Each link comes with the number of seconds it
+    may be cached for. With format=ndjson one JSON object per code is streamed,
+    in request order; unresolved codes come as {"short_code": ..., "missing": true}.
+    """
+    codes = list(dict.fromkeys(data.codes))
+    links = await resolve_links(redis, session, codes)
+    await session.release()
+
+    resolved = [
+        LinkResolved(
+            short_code=code,
+            original_url=links[code]["original_url"],
+            expires_at=links[code]["expires_at"],
+            ttl=cache_ttl(links[code]["expires_at"]),
+        )
+        for code in codes
+        if code in links
+    ]
+    if response_format == "ndjson":
+        lines = {link.short_code: link.model_dump_json() for link in resolved}
+        return StreamingResponse(
+            (
+                lines.get(code, json.dumps({"short_code": code, "missing": True}))
+                + "\n"
+                for code in codes
+            ),
+            media_type="application/x-ndjson",
+        )
+    return LinkResolveResult(
+        links=resolved, missing=[code for code in codes if code not in links]
     )
-    result = await session.execute(statement)
-    links = result.mappings().all()
-    return links
 
 
 @router.get("/{short_code}")
-@cache(expire=60)
 async def redirect_to_url(
     short_code: str,
-    session: AsyncSession = Depends(get_async_session),
+    request: Request,
+    session: LazySession = Depends(get_async_session),
+    redis: aioredis.Redis = Depends(get_redis),
     user=Depends(current_user),
 ):
     """
     Redirect to the original URL corresponding to the given short code.
-    Increments the click counter. Returns 404 if not found or expired.
+    Increments the click counter and records the visitor for unique counts.
+    Returns 404 if not found or expired.
+    The link itself is resolved through the in-process and Redis caches.
     """
-    statement = select(Link).where(Link.c.short_code == short_code)
-    result = await session.execute(statement)
-    link = result.all()
-    if link is None or len(link) == 0:
+    link = await resolve_link(redis, session, short_code)
+    if link is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Link not found"
         )
-    link = link[0]
     # user_id = getattr(user, "id", None)
 
     # if link.user_id and (user_id is None or link.user_id != user_id):
     #     raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed")
 
-    if link.expires_at and datetime.utcnow() > link.expires_at:
+    if link["expires_at"] and datetime.utcnow() > link["expires_at"]:
+        await invalidate_link(redis, short_code)
         raise HTTPException(status_code=status.HTTP_410_GONE, detail="Link has expired")
 
     statement = (
         update(Link)
         .where(Link.c.short_code == short_code)
         .values(click_count=Link.c.click_count + 1)
+        .returning(Link.c.user_id, Link.c.click_count)
     )
-    await session.execute(statement)
+    result = await session.execute(statement)
+    clicked = result.first()
     await session.commit()
-    return RedirectResponse(url=link.original_url)
+    # the rest is Redis only, hand the connection back right away
+    await session.release()
+
+    fingerprint = visitor_fingerprint(
+        request.client.host if request.client else None,
+        request.headers.get("user-agent"),
+    )
+    await record_visit(redis, short_code, fingerprint)
+    if clicked is not None and clicked.user_id is not None:
+        await record_click(redis, clicked.user_id, short_code, clicked.click_count)
+    return RedirectResponse(url=link["original_url"])
 
 
-@router.get("/{short_code}/stats", response_model=LinkRead)
+@router.get("/{short_code}/stats", response_model=LinkStats)
 async def get_link_stats(
     short_code: str,
-    session: AsyncSession = Depends(get_async_session),
+    start: Optional[date] = Query(None, description="First day of the visitors range"),
+    end: Optional[date] = Query(None, description="Last day of the visitors range"),
+    session: LazySession = Depends(get_async_session),
+    redis: aioredis.Redis = Depends(get_redis),
     user=Depends(current_active_user),
 ):
     """
     Get statistics for a short link (only available to the owner).
+    Unique visitors are estimated over [start, end], by default from the link
+    creation (at most a year back) to today.
     """
     statement = select(Link).filter(Link.c.short_code == short_code)
     result = await session.execute(statement)
@@ -166,14 +329,38 @@ async def get_link_stats(
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed to view stats"
         )
-    return link
+
+    end = end or datetime.utcnow().date()
+    start = start or max(
+        link.created_at.date(), end - timedelta(days=MAX_RANGE_DAYS - 1)
+    )
+    if start > end:
+        raise HTTPException(
+            status_code=400, detail="Range start must not be after its end."
+        )
+    if (end - start).days >= MAX_RANGE_DAYS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Range may not be longer than {MAX_RANGE_DAYS} days.",
+        )
+
+    unique_visitors = await count_unique_visitors(
+        redis, session, short_code, start, end
+    )
+    return {
+        **link._mapping,
+        "unique_visitors": unique_visitors,
+        "visitors_from": start,
+        "visitors_to": end,
+    }
 
 
 @router.put("/{short_code}", response_model=LinkRead)
 async def update_link(
     short_code: str,
     data: LinkUpdate,
-    session: AsyncSession = Depends(get_async_session),
+    session: LazySession = Depends(get_async_session),
+    redis: aioredis.Redis = Depends(get_redis),
     user=Depends(current_active_user),
 ):
     """
@@ -196,10 +383,15 @@ async def update_link(
     statement = (
         update(Link)
         .where(Link.c.short_code == short_code)
-        .values(original_url=str(data.original_url))
+        .values(
+            original_url=str(data.original_url),
+            host=normalize_host(str(data.original_url)),
+        )
     )
     await session.execute(statement)
     await session.commit()
+    await invalidate_link(redis, short_code)
+    await invalidate_user_searches(redis, user.id)
 
     statement = select(Link).filter(Link.c.short_code == short_code)
     result = await session.execute(statement)
@@ -211,7 +403,8 @@ async def update_link(
 @router.delete("/{short_code}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_link(
     short_code: str,
-    session: AsyncSession = Depends(get_async_session),
+    session: LazySession = Depends(get_async_session),
+    redis: aioredis.Redis = Depends(get_redis),
     user=Depends(current_active_user),
 ):
     """
@@ -233,5 +426,9 @@ async def delete_link(
 
     statement = delete(Link).filter(Link.c.short_code == short_code)
     await session.execute(statement)
+    await forget_visitors(redis, session, short_code)
     await session.commit()
+    await invalidate_link(redis, short_code)
+    await invalidate_user_searches(redis, user.id)
+    await record_link_deleted(redis, user.id, short_code, link.click_count)
     return {"detail": "Link deleted successfully"}
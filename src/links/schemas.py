@@ -1,6 +1,8 @@
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional
-from pydantic import BaseModel, HttpUrl
+from pydantic import BaseModel, Field, HttpUrl, constr
+
+RESOLVE_MAX_CODES = 5000
 
 
 class LinkBase(BaseModel):
@@ -25,3 +27,38 @@ class LinkRead(BaseModel):
 
     class Config:
         orm_mode = True
+
+
+class LinkStats(LinkRead):
+    unique_visitors: int
+    visitors_from: date
+    visitors_to: date
+
+
+class LinkResolveRequest(BaseModel):
+    codes: list[constr(max_length=100)] = Field(
+        ..., min_length=1, max_length=RESOLVE_MAX_CODES
+    )
+
+
+class LinkResolved(BaseModel):
+    short_code: str
+    original_url: str
+    expires_at: Optional[datetime] = None
+    ttl: int
+
+
+class LinkResolveResult(BaseModel):
+    links: list[LinkResolved]
+    missing: list[str]
+
+
+class LinkClicks(BaseModel):
+    short_code: str
+    click_count: int
+
+
+class LinkSummary(BaseModel):
+    total_links: int
+    total_clicks: int
+    top_links: list[LinkClicks]
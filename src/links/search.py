@@ -0,0 +1,80 @@
+import hashlib
+import json
+from typing import Optional
+from urllib.parse import urlsplit
+
+from redis import asyncio as aioredis
+from sqlalchemy import select
+from sqlalchemy.sql import Select
+
+from links.models import links as Link
+
+SEARCH_KEY_PREFIX = "links:search"
+SEARCH_CACHE_TTL = 60
+# Longer hosts are not valid DNS names and are stored as NULL.
+MAX_HOST_LENGTH = 255
+
+
+def normalize_host(value: str) -> Optional[str]:
+    """
+    Lowercased host without a leading "www.", from a URL or a bare host.
+    None if there is no host or it is longer than MAX_HOST_LENGTH.
+    """
+    value = value.strip()
+    if "://" not in value:
+        value = f"//{value}"
+    host = urlsplit(value).hostname
+    if not host:
+        return None
+    host = host[4:] if host.startswith("www.") else host
+    return host if len(host) <= MAX_HOST_LENGTH else None
+
+
+def build_search_statement(
+    user_id,
+    original_url: Optional[str] = None,
+    host: Optional[str] = None,
+    prefix: Optional[str] = None,
+    contains: Optional[str] = None,
+    after: Optional[int] = None,
+    limit: int = 50,
+) -> Select:
+    """
+    Keyset-paginated search over a user's links. One extra row is fetched to
+    tell whether there is a next page.
+    """
+    statement = select(Link).where(Link.c.user_id == user_id)
+    if original_url is not None:
+        statement = statement.where(Link.c.original_url == original_url)
+    if host is not None:
+        statement = statement.where(Link.c.host == normalize_host(host))
+    if prefix is not None:
+        statement = statement.where(
+            Link.c.original_url.istartswith(prefix, autoescape=True)
+        )
+    if contains is not None:
+        statement = statement.where(
+            Link.c.original_url.icontains(contains, autoescape=True)
+        )
+    if after is not None:
+        statement = statement.where(Link.c.id > after)
+    return statement.order_by(Link.c.id).limit(limit + 1)
+
+
+def search_version_key(user_id) -> str:
+    return f"{SEARCH_KEY_PREFIX}:version:{user_id}"
+
+
+async def search_cache_key(redis: aioredis.Redis, user_id, query: dict) -> str:
+    """
+    Cache keys embed a per-user version, so bumping it invalidates every
+    cached search of that user at once.
+    """
+    version = await redis.get(search_version_key(user_id))
+    digest = hashlib.md5(json.dumps(query, sort_keys=True).encode()).hexdigest()
+    return f"{SEARCH_KEY_PREFIX}:{user_id}:{int(version or 0)}:{digest}"
+
+
+async def invalidate_user_searches(redis: aioredis.Redis, user_id) -> None:
+    if user_id is not None:
+        await redis.incr(search_version_key(user_id))
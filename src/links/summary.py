@@ -0,0 +1,188 @@
+import asyncio
+import logging
+
+from redis import asyncio as aioredis
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import SUMMARY_RECONCILE_INTERVAL
+from database import async_session_maker, redis as default_redis
+from links.models import links as Link
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_KEY_PREFIX = "links:summary"
+TOP_KEY_PREFIX = "links:top"
+RECONCILE_LOCK_KEY = "locks:summary-reconcile"
+
+# Only reads extend this TTL: summaries of users that stop looking at them
+# fall out of Redis and out of reconciliation, they are rebuilt on the next read.
+SUMMARY_TTL = 7 * 24 * 3600
+# The sorted set keeps more codes than the API returns, so deleting a few top
+# links before the next reconciliation does not leave gaps.
+LEADERBOARD_SIZE = 100
+TOP_LIMIT = 20
+
+# Counters are only touched while a summary exists: incrementing a missing
+# one would start it from zero instead of the real totals. A leaderboard
+# created here gets the remaining TTL of the counters.
+APPLY_DELTA = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('HINCRBY', KEYS[1], 'links', ARGV[1])
+redis.call('HINCRBY', KEYS[1], 'clicks', ARGV[2])
+if ARGV[4] == '-' then
+    redis.call('ZREM', KEYS[2], ARGV[3])
+elseif ARGV[4] ~= '' then
+    redis.call('ZADD', KEYS[2], ARGV[4], ARGV[3])
+    redis.call('ZREMRANGEBYRANK', KEYS[2], 0, -(tonumber(ARGV[5]) + 1))
+    if redis.call('PTTL', KEYS[2]) == -1 then
+        local ttl = redis.call('PTTL', KEYS[1])
+        if ttl > 0 then
+            redis.call('PEXPIRE', KEYS[2], ttl)
+        end
+    end
+end
+return 1
+"""
+_apply_delta = default_redis.register_script(APPLY_DELTA)
+
+
+def summary_key(user_id) -> str:
+    return f"{SUMMARY_KEY_PREFIX}:{user_id}"
+
+
+def top_key(user_id) -> str:
+    return f"{TOP_KEY_PREFIX}:{user_id}"
+
+
+async def _update_summary(
+    redis: aioredis.Redis, user_id, links: int, clicks: int, short_code: str, score
+) -> None:
+    await _apply_delta(
+        keys=[summary_key(user_id), top_key(user_id)],
+        args=[links, clicks, short_code, score, LEADERBOARD_SIZE],
+        client=redis,
+    )
+
+
+async def record_link_created(
+    redis: aioredis.Redis, user_id, short_code: str
+) -> None:
+    await _update_summary(redis, user_id, 1, 0, short_code, 0)
+
+
+async def record_link_deleted(
+    redis: aioredis.Redis, user_id, short_code: str, click_count: int
+) -> None:
+    await _update_summary(redis, user_id, -1, -click_count, short_code, "-")
+
+
+async def record_click(
+    redis: aioredis.Redis, user_id, short_code: str, click_count: int
+) -> None:
+    """
+    Count one click; `click_count` is the link total after it, so the
+    leaderboard score is exact even if earlier updates were missed.
+    """
+    await _update_summary(redis, user_id, 0, 1, short_code, click_count)
+
+
+async def reconcile_summary(
+    redis: aioredis.Redis, session: AsyncSession, user_id, create: bool = False
+) -> None:
+    """
+    Rebuild a user's counters and leaderboard from Postgres, keeping the
+    remaining TTL. A summary that has expired meanwhile is only created
+    again with `create`.
+    """
+    ttl = await redis.pttl(summary_key(user_id))
+    if ttl == -2 and not create:
+        return
+    if ttl < 0:
+        ttl = SUMMARY_TTL * 1000
+
+    statement = select(
+        func.count(), func.coalesce(func.sum(Link.c.click_count), 0)
+    ).where(Link.c.user_id == user_id)
+    result = await session.execute(statement)
+    total_links, total_clicks = result.one()
+
+    statement = (
+        select(Link.c.short_code, Link.c.click_count)
+        .where(Link.c.user_id == user_id)
+        .order_by(Link.c.click_count.desc())
+        .limit(LEADERBOARD_SIZE)
+    )
+    result = await session.execute(statement)
+    top = {row.short_code: row.click_count for row in result.all()}
+
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.delete(summary_key(user_id), top_key(user_id))
+        pipe.hset(
+            summary_key(user_id), mapping={"links": total_links, "clicks": total_clicks}
+        )
+        if top:
+            pipe.zadd(top_key(user_id), top)
+        pipe.pexpire(summary_key(user_id), ttl)
+        pipe.pexpire(top_key(user_id), ttl)
+        await pipe.execute()
+
+
+async def _read_summary(redis: aioredis.Redis, user_id, limit: int):
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.hgetall(summary_key(user_id))
+        pipe.zrevrange(top_key(user_id), 0, limit - 1, withscores=True)
+        pipe.expire(summary_key(user_id), SUMMARY_TTL)
+        pipe.expire(top_key(user_id), SUMMARY_TTL)
+        counters, top, *_ = await pipe.execute()
+    return counters, top
+
+
+async def get_summary(
+    redis: aioredis.Redis, session: AsyncSession, user_id, limit: int = TOP_LIMIT
+) -> dict:
+    """
+    Totals and top links of a user, read from Redis in O(log n + limit).
+    A missing summary is rebuilt from Postgres first.
+    """
+    counters, top = await _read_summary(redis, user_id, limit)
+    if not counters:
+        await reconcile_summary(redis, session, user_id, create=True)
+        counters, top = await _read_summary(redis, user_id, limit)
+    return {
+        "total_links": int(counters[b"links"]),
+        "total_clicks": int(counters[b"clicks"]),
+        "top_links": [
+            {"short_code": short_code.decode(), "click_count": int(clicks)}
+            for short_code, clicks in top
+        ],
+    }
+
+
+async def run_summary_reconciler(interval: int = SUMMARY_RECONCILE_INTERVAL) -> None:
+    """
+    Periodically rebuild every summary still in Redis, correcting drift from
+    lost updates. Like the visitors persister, one worker runs per interval.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            locked = await default_redis.set(
+                RECONCILE_LOCK_KEY, 1, nx=True, ex=interval
+            )
+            if not locked:
+                continue
+            reconciled = 0
+            async with async_session_maker() as session:
+                async for key in default_redis.scan_iter(
+                    match=f"{SUMMARY_KEY_PREFIX}:*", count=1000
+                ):
+                    user_id = key.decode().rsplit(":", 1)[1]
+                    await reconcile_summary(default_redis, session, user_id)
+                    await session.commit()
+                    reconciled += 1
+            logger.info("Reconciled %s link summaries", reconciled)
+        except Exception:
+            logger.exception("Failed to reconcile link summaries")
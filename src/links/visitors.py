@@ -0,0 +1,182 @@
+import asyncio
+import hashlib
+import logging
+import uuid
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from redis import asyncio as aioredis
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import VISITOR_SALT, VISITORS_PERSIST_INTERVAL
+from database import async_session_maker, redis as default_redis
+from links.models import link_visitors as LinkVisitors
+
+logger = logging.getLogger(__name__)
+
+VISITORS_KEY_PREFIX = "hll:visitors"
+VISITORS_TMP_PREFIX = "hll:tmp"
+# Daily keys written since the last persist run.
+VISITORS_DIRTY_KEY = "hll:dirty"
+PERSIST_LOCK_KEY = "locks:visitors-persist"
+
+# Daily keys live much longer than the persist interval, so a few missed
+# runs never lose a day.
+VISITORS_KEY_TTL = 7 * 24 * 3600
+MAX_RANGE_DAYS = 366
+PERSIST_BATCH_SIZE = 500
+
+
+def visitor_fingerprint(ip: Optional[str], user_agent: Optional[str]) -> str:
+    """
+    Salted hash of the visitor IP and user agent. Raw values never reach Redis.
+    """
+    raw = f"{VISITOR_SALT}|{ip or ''}|{user_agent or ''}"
+    return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+
+def visitors_key(short_code: str, day: date) -> str:
+    return f"{VISITORS_KEY_PREFIX}:{short_code}:{day:%Y%m%d}"
+
+
+def days_between(start: date, end: date) -> list[date]:
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+async def record_visit(
+    redis: aioredis.Redis, short_code: str, fingerprint: str
+) -> None:
+    key = visitors_key(short_code, datetime.utcnow().date())
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.pfadd(key, fingerprint)
+        pipe.expire(key, VISITORS_KEY_TTL)
+        pipe.sadd(VISITORS_DIRTY_KEY, key)
+        await pipe.execute()
+
+
+async def count_unique_visitors(
+    redis: aioredis.Redis,
+    session: AsyncSession,
+    short_code: str,
+    start: date,
+    end: date,
+) -> int:
+    """
+    Estimate unique visitors of a link between `start` and `end` (inclusive).
+    Days still in Redis are merged directly, older days are restored from
+    the HyperLogLogs persisted in Postgres.
+    """
+    days = days_between(start, end)
+    keys = [visitors_key(short_code, day) for day in days]
+    async with redis.pipeline(transaction=False) as pipe:
+        for key in keys:
+            pipe.exists(key)
+        live = await pipe.execute()
+
+    sources = [key for key, exists in zip(keys, live) if exists]
+    missing = [day for day, exists in zip(days, live) if not exists]
+    blobs = []
+    if missing:
+        statement = select(LinkVisitors.c.hll).where(
+            LinkVisitors.c.short_code == short_code, LinkVisitors.c.day.in_(missing)
+        )
+        result = await session.execute(statement)
+        blobs = result.scalars().all()
+
+    if not sources and not blobs:
+        return 0
+
+    merged = f"{VISITORS_TMP_PREFIX}:{uuid.uuid4().hex}"
+    restored = [f"{merged}:{i}" for i in range(len(blobs))]
+    async with redis.pipeline(transaction=False) as pipe:
+        for key, blob in zip(restored, blobs):
+            pipe.set(key, blob, ex=60)
+        pipe.pfmerge(merged, *sources, *restored)
+        pipe.pfcount(merged)
+        pipe.delete(merged, *restored)
+        results = await pipe.execute()
+    return results[-2]
+
+
+async def forget_visitors(
+    redis: aioredis.Redis, session: AsyncSession, short_code: str
+) -> None:
+    """
+    Drop visitor history of a deleted link so a reused alias starts clean.
+    The caller is responsible for committing the session.
+    """
+    today = datetime.utcnow().date()
+    retention = timedelta(seconds=VISITORS_KEY_TTL)
+    keys = [
+        visitors_key(short_code, day)
+        for day in days_between(today - retention, today)
+    ]
+    await redis.delete(*keys)
+    statement = delete(LinkVisitors).where(LinkVisitors.c.short_code == short_code)
+    await session.execute(statement)
+
+
+async def persist_daily_visitors(redis: aioredis.Redis, session: AsyncSession) -> int:
+    """
+    Upsert the registers of every daily HyperLogLog written since the last
+    run, so closed days are stored once instead of on every run until their
+    key expires. Returns the number of persisted days.
+    """
+    persisted = 0
+    while True:
+        keys = await redis.spop(VISITORS_DIRTY_KEY, PERSIST_BATCH_SIZE)
+        if not keys:
+            return persisted
+        try:
+            persisted += await _persist_batch(redis, session, keys)
+            await session.commit()
+        except Exception:
+            # keep them for the next run
+            await redis.sadd(VISITORS_DIRTY_KEY, *keys)
+            raise
+
+
+async def _persist_batch(
+    redis: aioredis.Redis, session: AsyncSession, keys: list[bytes]
+) -> int:
+    rows = []
+    for key, blob in zip(keys, await redis.mget(keys)):
+        if blob is None:
+            # expired or deleted since it was written
+            continue
+        short_code, day = key.decode().rsplit(":", 2)[1:]
+        rows.append(
+            {
+                "short_code": short_code,
+                "day": datetime.strptime(day, "%Y%m%d").date(),
+                "hll": blob,
+            }
+        )
+    if not rows:
+        return 0
+
+    statement = pg_insert(LinkVisitors).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=[LinkVisitors.c.short_code, LinkVisitors.c.day],
+        set_={"hll": statement.excluded.hll},
+    )
+    await session.execute(statement)
+    return len(rows)
+
+
+async def run_visitors_persister(interval: int = VISITORS_PERSIST_INTERVAL) -> None:
+    """
+    Background loop started by every worker. The Redis lock makes sure only
+    one of them persists per interval.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if await default_redis.set(PERSIST_LOCK_KEY, 1, nx=True, ex=interval):
+                async with async_session_maker() as session:
+                    persisted = await persist_daily_visitors(default_redis, session)
+                logger.info("Persisted %s daily visitor counters", persisted)
+        except Exception:
+            logger.exception("Failed to persist daily visitor counters")
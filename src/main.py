@@ -1,24 +1,33 @@
+import asyncio
+
 from fastapi import FastAPI, Depends
 from fastapi_cache.backends.redis import RedisBackend
 from fastapi_cache import FastAPICache
 from collections.abc import AsyncIterator
 from contextlib import asynccontextmanager
 from auth.schemas import UserCreate, UserRead
-from redis import asyncio as aioredis
 
 from auth.users import auth_backend, current_active_user, fastapi_users
 from auth.db import User
+from database import redis
+from links.cache import run_invalidation_listener
 from links.router import router as links_router
-from config import REDIS_HOST
+from links.summary import run_summary_reconciler
+from links.visitors import run_visitors_persister
 
 import uvicorn
 
 
 @asynccontextmanager
 async def lifespan(_: FastAPI) -> AsyncIterator[None]:
-    redis = aioredis.from_url(f"redis://{REDIS_HOST}")
     FastAPICache.init(RedisBackend(redis), prefix="fastapi-cache")
+    persister = asyncio.create_task(run_visitors_persister())
+    invalidation_listener = asyncio.create_task(run_invalidation_listener())
+    reconciler = asyncio.create_task(run_summary_reconciler())
     yield
+    reconciler.cancel()
+    invalidation_listener.cancel()
+    persister.cancel()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import Column, String, TIMESTAMP, Boolean
+from sqlalchemy import Column, String, TIMESTAMP, Boolean, Index, func
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import declarative_base
 
@@ -17,3 +17,6 @@ class User(Base):
     is_active = Column(Boolean, default=True, nullable=False)
     is_superuser = Column(Boolean, default=True, nullable=False)
     is_verified = Column(Boolean, default=True, nullable=False)
+
+    # logins and the link import look users up by case-insensitive email
+    __table_args__ = (Index("ix_user_email_lower", func.lower(email)),)
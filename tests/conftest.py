@@ -14,6 +14,23 @@ engine = create_async_engine(TEST_DATABASE_URL, echo=True)
 TestSessionLocal = async_sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+def pytest_addoption(parser):
+    parser.addoption(
+        "--plan-check",
+        action="store_true",
+        help="Run EXPLAIN ANALYZE checks against the seeded Postgres from the environment",
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--plan-check"):
+        return
+    skip_plans = pytest.mark.skip(reason="needs --plan-check and a seeded Postgres")
+    for item in items:
+        if "plans" in item.keywords:
+            item.add_marker(skip_plans)
+
+
 @pytest.fixture(scope="function", autouse=True)
 async def setup_database():
     async with engine.begin() as conn:
@@ -1,7 +1,15 @@
+import json
+import uuid
+
 import pytest
 from datetime import datetime, timedelta
 from fastapi import status
 from httpx import AsyncClient
+from sqlalchemy import event
+
+from database import async_session_maker, engine, redis
+from links.summary import reconcile_summary, summary_key, top_key
+from links.visitors import MAX_RANGE_DAYS, persist_daily_visitors, visitors_key
 
 
 @pytest.mark.anyio
@@ -31,6 +39,7 @@ async def test_links(client: AsyncClient):
         "/auth/register", json={"email": new_unique_email, "password": password}
     )
     assert response.status_code == 201
+    user_id = response.json()["id"]
 
     response = await client.post(
         "/auth/jwt/login",
@@ -82,6 +91,31 @@ async def test_links(client: AsyncClient):
     response = await client.post("/links/shorten", json=payload, headers=headers)
     assert response.status_code == 400
 
+    # Тестируем /links/resolve
+
+    response = await client.post(
+        "/links/resolve", json={"codes": [short_code, "missing_code"]}, headers=headers
+    )
+    assert response.status_code == 200
+    assert [link["short_code"] for link in response.json()["links"]] == [short_code]
+    assert response.json()["links"][0]["original_url"] == "https://example.org/"
+    assert response.json()["missing"] == ["missing_code"]
+
+    response = await client.post(
+        "/links/resolve?format=ndjson",
+        json={"codes": [short_code, "missing_code"]},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[0]["short_code"] == short_code
+    assert lines[1] == {"short_code": "missing_code", "missing": True}
+
+    response = await client.post(
+        "/links/resolve", json={"codes": ["x" * 101]}, headers=headers
+    )
+    assert response.status_code == 422
+
     # Тестируем /links/{short_code}/stats
 
     stats = await client.get(f"/links/{short_code}/stats", headers=headers)
@@ -93,6 +127,48 @@ async def test_links(client: AsyncClient):
     stats2 = await client.get(f"/links/{short_code}/stats", headers=headers)
     assert stats2.status_code == 200
     assert stats2.json()["click_count"] >= 1, stats2.json()["click_count"]
+    assert stats.json()["unique_visitors"] == 0
+    assert stats2.json()["unique_visitors"] == 1
+
+    today = datetime.utcnow().date()
+    response = await client.get(
+        f"/links/{short_code}/stats",
+        params={"start": today.isoformat(), "end": str(today - timedelta(days=1))},
+        headers=headers,
+    )
+    assert response.status_code == 400
+    response = await client.get(
+        f"/links/{short_code}/stats",
+        params={"start": str(today - timedelta(days=MAX_RANGE_DAYS))},
+        headers=headers,
+    )
+    assert response.status_code == 400
+
+    # Дни, которых уже нет в Redis, восстанавливаются из link_visitors
+
+    async with async_session_maker() as session:
+        assert await persist_daily_visitors(redis, session) >= 1
+        # неизменившиеся дни повторно не пишутся
+        assert await persist_daily_visitors(redis, session) == 0
+    await redis.delete(visitors_key(short_code, today))
+    stats3 = await client.get(f"/links/{short_code}/stats", headers=headers)
+    assert stats3.json()["unique_visitors"] == 1
+
+    # Тестируем /links/summary
+
+    summary = await client.get("/links/summary", headers=headers)
+    assert summary.status_code == 200
+    assert summary.json()["total_links"] == 1
+    assert summary.json()["total_clicks"] == stats2.json()["click_count"]
+    assert summary.json()["top_links"][0]["short_code"] == short_code
+
+    # Сверка с БД не продлевает TTL сводки, его продлевает только чтение
+
+    await redis.pexpire(summary_key(user_id), 60_000)
+    async with async_session_maker() as session:
+        await reconcile_summary(redis, session, user_id)
+    assert 0 < await redis.pttl(summary_key(user_id)) <= 60_000
+    assert 0 < await redis.pttl(top_key(user_id)) <= 60_000
 
     # Тестируем put /links/{short_code}
 
@@ -103,6 +179,11 @@ async def test_links(client: AsyncClient):
     assert response.status_code == 200
     assert response.json()["original_url"] == new_url
 
+    # старый адрес уже лежит в кэше после переходов выше
+    response = await client.get(f"/links/{short_code}", follow_redirects=False)
+    assert response.status_code in (302, 307)
+    assert response.headers.get("location") == new_url
+
     # Тестируем delete /links/{short_code}
 
     response = await client.delete(f"/links/{short_code}", headers=headers)
@@ -110,3 +191,40 @@ async def test_links(client: AsyncClient):
 
     response = await client.get(f"/links/{short_code}", follow_redirects=False)
     assert response.status_code == 404
+
+    summary = await client.get("/links/summary", headers=headers)
+    assert summary.json() == {"total_links": 0, "total_clicks": 0, "top_links": []}
+
+
+@pytest.mark.anyio
+async def test_cached_search_does_not_check_out_connections(client: AsyncClient):
+    email = f"{uuid.uuid4().hex}@test.com"
+    response = await client.post(
+        "/auth/register", json={"email": email, "password": "default"}
+    )
+    assert response.status_code == 201
+    response = await client.post(
+        "/auth/jwt/login",
+        data={"username": email, "password": "default"},
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    checkouts = []
+
+    def count_checkout(*args):
+        checkouts.append(1)
+
+    event.listen(engine.sync_engine, "checkout", count_checkout)
+    try:
+        params = {"host": f"{uuid.uuid4().hex}.example.com"}
+        response = await client.get("/links/search", params=params, headers=headers)
+        assert response.status_code == 200
+        assert len(checkouts) == 1
+
+        # both the user and the search come from Redis now
+        response = await client.get("/links/search", params=params, headers=headers)
+        assert response.status_code == 200
+        assert response.json() == []
+        assert len(checkouts) == 1
+    finally:
+        event.remove(engine.sync_engine, "checkout", count_checkout)
@@ -0,0 +1,160 @@
+import json
+import os
+import re
+from datetime import datetime
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import event, text
+
+from commands.seed import (
+    SEED_PASSWORD,
+    SEED_PLACEHOLDER_PASSWORD,
+    encode_code,
+    seed_email,
+)
+from database import engine
+
+# Run with `pytest --plan-check` against the Postgres configured in the
+# environment, after seeding it: `cd src && python -m commands.seed`.
+pytestmark = pytest.mark.plans
+
+TIME_BUDGET_MS = float(os.getenv("PLAN_TIME_BUDGET_MS", 50))
+MIN_SEEDED_LINKS = int(os.getenv("PLAN_MIN_SEEDED_LINKS", 100_000))
+CHECKED_RELATIONS = {"links", "link_visitors", "user"}
+CHECKED_STATEMENT = re.compile(r'\blinks\b|\blink_visitors\b|"user"')
+
+
+def plan_nodes(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+async def explain(statement, parameters):
+    # EXPLAIN ANALYZE really runs the statement, so never keep its effects
+    async with engine.connect() as conn:
+        transaction = await conn.begin()
+        try:
+            result = await conn.exec_driver_sql(
+                f"EXPLAIN (ANALYZE, FORMAT JSON) {statement}", parameters
+            )
+            plan = result.scalar()
+        finally:
+            await transaction.rollback()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]
+
+
+async def login_heavy_owner(client: AsyncClient):
+    """
+    Log in as the first user of a seeded run, who owns the most links. The
+    run is taken from PLAN_SEED_RUN, or any run seeded with a password.
+    """
+    run = os.getenv("PLAN_SEED_RUN")
+    if run is None:
+        async with engine.connect() as conn:
+            email = await conn.scalar(
+                text(
+                    'SELECT email FROM "user" '
+                    "WHERE email LIKE :pattern AND hashed_password <> :placeholder "
+                    "LIMIT 1"
+                ),
+                {
+                    "pattern": seed_email("%", 0),
+                    "placeholder": SEED_PLACEHOLDER_PASSWORD,
+                },
+            )
+    else:
+        email = seed_email(run, 0)
+    response = await client.post(
+        "/auth/jwt/login",
+        data={"username": email or "", "password": SEED_PASSWORD},
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
+    if response.status_code != 200:
+        pytest.skip("Reseed the database: its seeded users cannot log in")
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def drive_links_router(client: AsyncClient, headers) -> str:
+    """
+    Call every endpoint of links.router. Returns the code of the anonymous
+    link it creates, which nobody can delete through the API.
+    """
+    alias = f"plans_{int(datetime.utcnow().timestamp())}"
+    url = "https://example.com/campaign/plans"
+    response = await client.post(
+        "/links/shorten", json={"original_url": url, "alias": alias}, headers=headers
+    )
+    assert response.status_code == 201
+    response = await client.post("/links/shorten", json={"original_url": url})
+    anonymous = response.json()["short_code"]
+    await client.get(f"/links/{alias}", follow_redirects=False)
+    await client.post(
+        "/links/resolve",
+        json={"codes": [alias, encode_code(1), encode_code(2)]},
+        headers=headers,
+    )
+    await client.get(f"/links/{alias}/stats", headers=headers)
+    await client.get("/links/summary", headers=headers)
+    await client.get("/links/search", params={"original_url": url}, headers=headers)
+    await client.get("/links/search", params={"host": "example.com"}, headers=headers)
+    await client.get(
+        "/links/search", params={"contains": "/campaign/"}, headers=headers
+    )
+    await client.put(
+        f"/links/{alias}", json={"original_url": url + "/v2"}, headers=headers
+    )
+    await client.delete(f"/links/{alias}", headers=headers)
+    return anonymous
+
+
+@pytest.mark.anyio
+async def test_links_router_query_plans(client: AsyncClient):
+    async with engine.connect() as conn:
+        seeded = await conn.scalar(
+            text("SELECT reltuples::bigint FROM pg_class WHERE relname = 'links'")
+        )
+    if (seeded or 0) < MIN_SEEDED_LINKS:
+        pytest.skip("Seed the database first: cd src && python -m commands.seed")
+
+    headers = await login_heavy_owner(client)
+
+    queries = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if CHECKED_STATEMENT.search(statement):
+            queries.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", capture)
+    anonymous = None
+    try:
+        anonymous = await drive_links_router(client, headers)
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", capture)
+        if anonymous is not None:
+            async with engine.begin() as conn:
+                await conn.execute(
+                    text("DELETE FROM links WHERE short_code = :code"),
+                    {"code": anonymous},
+                )
+    assert queries
+
+    problems = []
+    for statement, parameters in queries:
+        plan = await explain(statement, parameters)
+        seq_scans = {
+            node["Relation Name"]
+            for node in plan_nodes(plan["Plan"])
+            if node["Node Type"] == "Seq Scan"
+            and node.get("Relation Name") in CHECKED_RELATIONS
+        }
+        if seq_scans:
+            problems.append(f"Seq Scan on {sorted(seq_scans)}: {statement}")
+        if plan["Execution Time"] > TIME_BUDGET_MS:
+            problems.append(
+                f"{plan['Execution Time']:.1f}ms > {TIME_BUDGET_MS}ms: {statement}"
+            )
+    assert not problems, "\n".join(problems)
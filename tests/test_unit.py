@@ -1,6 +1,25 @@
+import asyncio
+import random
+import uuid
+from datetime import date, datetime
+
 import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 
-from links.router import generate_random_code
+from commands.import_links import (
+    load_checkpoint,
+    read_rows,
+    save_checkpoint,
+    validate_chunk,
+)
+from commands.seed import encode_code, link_records
+from database import LazySession
+from links.cache import LinkCache, link_cache, run_invalidation_listener
+from links.router import ALIAS_PATTERN, generate_random_code
+from links.search import build_search_statement, normalize_host
+from links.visitors import days_between, visitor_fingerprint, visitors_key
 
 
 @pytest.mark.parametrize(
@@ -11,3 +30,243 @@ def test_generate_random_code_length(length):
     code = generate_random_code(length)
     assert len(code) == length
     assert all(c.isdigit() or c.isalpha() for c in code)
+
+
+def test_visitor_fingerprint_is_stable_and_opaque():
+    fingerprint = visitor_fingerprint("127.0.0.1", "curl/8.0")
+    assert fingerprint == visitor_fingerprint("127.0.0.1", "curl/8.0")
+    assert fingerprint != visitor_fingerprint("127.0.0.2", "curl/8.0")
+    assert "127.0.0.1" not in fingerprint
+
+
+def test_days_between_is_inclusive():
+    days = days_between(date(2026, 2, 27), date(2026, 3, 1))
+    assert days == [date(2026, 2, 27), date(2026, 2, 28), date(2026, 3, 1)]
+    assert visitors_key("abc", days[0]) == "hll:visitors:abc:20260227"
+
+
+def test_link_cache_evicts_least_recently_used_by_size():
+    cache = LinkCache(max_bytes=1000)
+    cache.enabled = True
+    for code in ("a", "b", "c", "d"):
+        cache.set(code, "https://example.com/" + code, None, ttl=60)
+    assert cache.size <= 1000
+    assert cache.get("a") is None
+    assert cache.get("d")["original_url"] == "https://example.com/d"
+
+    cache.set("huge", "https://example.com/" + "x" * 2000, None, ttl=60)
+    assert cache.get("huge") is None
+
+
+def test_link_cache_ignores_expired_and_disabled_entries():
+    cache = LinkCache(max_bytes=10_000)
+    cache.set("a", "https://example.com/", None, ttl=60)
+    assert len(cache) == 0
+
+    cache.enabled = True
+    cache.set("a", "https://example.com/", None, ttl=60)
+    cache.set("b", "https://example.com/", None, ttl=0)
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+
+    cache.enabled = False
+    assert cache.get("a") is None
+
+
+def test_link_cache_drops_fills_started_before_an_invalidation():
+    cache = LinkCache(max_bytes=10_000)
+    cache.enabled = True
+    generation = cache.generation
+    cache.invalidate("a")
+    cache.set("a", "https://example.com/old", None, 60, generation)
+    assert cache.get("a") is None
+
+    cache.set("a", "https://example.com/new", None, 60, cache.generation)
+    assert cache.get("a")["original_url"] == "https://example.com/new"
+
+
+class _FakePubSub:
+    def __init__(self, messages: asyncio.Queue):
+        self.messages = messages
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def subscribe(self, channel: str) -> None:
+        pass
+
+    async def listen(self):
+        while True:
+            message = await self.messages.get()
+            if isinstance(message, Exception):
+                raise message
+            yield message
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.messages = asyncio.Queue()
+        self.subscriptions = 0
+
+    def pubsub(self) -> _FakePubSub:
+        self.subscriptions += 1
+        return _FakePubSub(self.messages)
+
+
+async def _wait_for(condition) -> None:
+    for _ in range(300):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition not reached")
+
+
+@pytest.mark.anyio
+async def test_invalidation_listener_evicts_and_flushes_on_reconnect():
+    redis = _FakeRedis()
+    listener = asyncio.create_task(run_invalidation_listener(redis))
+    try:
+        await _wait_for(lambda: link_cache.enabled)
+        link_cache.set("a", "https://example.com/a", None, ttl=60)
+        link_cache.set("b", "https://example.com/b", None, ttl=60)
+
+        await redis.messages.put({"type": "message", "data": b"a"})
+        await _wait_for(lambda: len(link_cache) == 1)
+        assert link_cache.get("a") is None
+        assert link_cache.get("b") is not None
+
+        await redis.messages.put(RedisConnectionError())
+        await _wait_for(lambda: not link_cache.enabled)
+        assert len(link_cache) == 0
+        link_cache.set("c", "https://example.com/c", None, ttl=60)
+        assert len(link_cache) == 0
+
+        await _wait_for(lambda: redis.subscriptions == 2 and link_cache.enabled)
+        assert len(link_cache) == 0
+    finally:
+        listener.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await listener
+    assert not link_cache.enabled
+
+
+def test_seeded_links_have_unique_codes_and_valid_rows():
+    rng = random.Random(0)
+    rows = list(link_records("test", 100, 1, 1000, 0.3, rng, datetime.utcnow()))
+    codes = {row[3] for row in rows}
+    assert len(codes) == 1000
+    assert all(len(code) == 8 and code.startswith("~") for code in codes)
+    assert all(row[1].startswith("https://") for row in rows)
+    assert all(row[2] == normalize_host(row[1]) for row in rows)
+    assert "www.youtube.com" not in {row[2] for row in rows}
+    assert any(row[0] is None for row in rows)
+    assert encode_code(0) == "~0000000"
+    assert not ALIAS_PATTERN.match(encode_code(1))
+
+
+@pytest.mark.parametrize(
+    "value, host",
+    [
+        ("https://www.Example.com/campaign/2026", "example.com"),
+        ("example.com", "example.com"),
+        ("http://user@docs.example.com:8080/", "docs.example.com"),
+        ("http://[::1]:8080/", "::1"),
+        ("https://" + ".".join(["a" * 60] * 5) + ".com/x", None),
+        ("", None),
+    ],
+)
+def test_normalize_host(value, host):
+    assert normalize_host(value) == host
+
+
+def test_search_statement_escapes_wildcards_and_paginates():
+    statement = build_search_statement(
+        uuid.uuid4(), contains="100%_off", after=10, limit=5
+    )
+    compiled = statement.compile(compile_kwargs={"literal_binds": True})
+    sql = str(compiled)
+    assert "100/%/_off" in sql
+    assert "links.id > 10" in sql
+    assert "LIMIT 6" in sql
+
+
+@pytest.mark.anyio
+async def test_lazy_session_checks_out_only_when_used():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    checkouts = []
+    event.listen(engine.sync_engine, "checkout", lambda *args: checkouts.append(1))
+
+    session = LazySession(async_sessionmaker(engine))
+    await session.commit()
+    await session.release()
+    assert not session.started
+    assert checkouts == []
+
+    assert await session.scalar(text("SELECT 1")) == 1
+    assert len(checkouts) == 1
+    await session.release()
+    assert not session.started
+    await engine.dispose()
+
+
+def test_import_validation_rejects_bad_rows():
+    rows = [
+        {"short_code": "ok_1", "original_url": "https://www.example.com/a"},
+        {"short_code": "bad code", "original_url": "https://example.com/"},
+        {"short_code": "search", "original_url": "https://example.com/"},
+        {"short_code": "ok_1", "original_url": "https://example.com/b"},
+        {"short_code": "ok_2", "original_url": "ftp://example.com/"},
+        {
+            "short_code": "ok_3",
+            "original_url": "https://example.com/",
+            "expires_at": "soon",
+        },
+        {
+            "short_code": "ok_4",
+            "original_url": "https://example.com/",
+            "expires_at": "2026-01-01T10:00:00+03:00",
+            "owner_email": " Owner@Example.com ",
+        },
+        None,
+        ["ok_5", "https://example.com/"],
+        {"short_code": 5, "original_url": "https://example.com/"},
+        {"short_code": "ok_6", "original_url": "https://example.com/", "expires_at": 1},
+    ]
+    valid, rejected = validate_chunk(rows, first_line=11)
+    assert [row["short_code"] for row in valid] == ["ok_1", "ok_4"]
+    assert valid[0]["host"] == "example.com"
+    assert valid[1]["expires_at"] == datetime(2026, 1, 1, 7, 0)
+    assert valid[1]["owner_email"] == "owner@example.com"
+    assert [(line, reason) for line, _, reason in rejected] == [
+        (12, "invalid short_code"),
+        (13, "reserved short_code"),
+        (14, "duplicate short_code in input"),
+        (15, "invalid original_url"),
+        (16, "invalid expires_at"),
+        (18, "malformed line"),
+        (19, "malformed line"),
+        (20, "invalid short_code"),
+        (21, "invalid expires_at"),
+    ]
+
+
+def test_import_reads_malformed_ndjson_lines_as_none(tmp_path):
+    path = tmp_path / "links.ndjson"
+    path.write_text('{"short_code": "a"}\n{not json\n\n[1, 2]\n', encoding="utf-8")
+    assert list(read_rows(str(path), "ndjson")) == [{"short_code": "a"}, None, [1, 2]]
+
+
+def test_import_checkpoint_is_refused_for_a_changed_input(tmp_path):
+    source = tmp_path / "links.csv"
+    checkpoint = str(tmp_path / "links.csv.checkpoint")
+    source.write_text("short_code,original_url\n", encoding="utf-8")
+    assert load_checkpoint(checkpoint, str(source)) == 0
+    save_checkpoint(checkpoint, str(source), 20_000)
+    assert load_checkpoint(checkpoint, str(source)) == 20_000
+
+    source.write_text("short_code,original_url\nabc,https://example.com/\n")
+    with pytest.raises(SystemExit):
+        load_checkpoint(checkpoint, str(source))